@@ -1,5 +1,21 @@
+import io
+import logging
 import os
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import quote
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+from urllib3.util.retry import Retry
 from flask import Flask, request, jsonify
 from msal import ConfidentialClientApplication
 
@@ -13,6 +29,8 @@ Required Environment Variables:
     - SP_CLIENT_SECRET: SharePoint application client secret
     - SP_TENANT_ID: SharePoint tenant ID
     - SP_SITE_ID: SharePoint site ID
+    - SECRET_KEY: Flask secret key
+    - LOG_LEVEL: (optional) Logging level, case-insensitive, defaults to WARNING
 """
 
 # SharePoint Configuration
@@ -21,75 +39,358 @@ SP_CLIENT_SECRET = os.getenv("SP_CLIENT_SECRET", "")
 SP_TENANT_ID = os.getenv("SP_TENANT_ID", "")
 SP_SITE_ID = os.getenv("SP_SITE_ID", "")
 
+# Logging; INFO-level folder and upload messages are dropped unless LOG_LEVEL enables them
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+# Unknown level names fall back to WARNING instead of failing at import
+logging.basicConfig(level=LOG_LEVEL if isinstance(logging.getLevelName(LOG_LEVEL), int) else logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# Microsoft Graph endpoints, built once from the site configuration
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+DRIVE_ROOT_PATH = f"/sites/{SP_SITE_ID}/drive/root"  # Relative form used inside $batch
+DRIVE_ROOT_URL = f"{GRAPH_URL}{DRIVE_ROOT_PATH}"
+
 # Initialize Flask app
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this in production
-app.config['DEBUG'] = True
+app.config['SECRET_KEY'] = os.getenv("SECRET_KEY", "")
+
+# Resolved addresses, mapped to (getaddrinfo results, expires_at)
+_DNS_CACHE = {}
+DNS_CACHE_TTL = 300  # seconds
+_dns_lock = threading.Lock()
+
+# DNS Caching
+def resolve_host(host, port):
+    """
+    Resolve a hostname, reusing the result for DNS_CACHE_TTL seconds.
+    
+    Args:
+        host (str): Hostname to resolve
+        port (int): Port the connection will use
+    
+    Returns:
+        list: getaddrinfo results for the families urllib3 allows, or an empty
+        list if resolution fails
+    """
+    cached = _DNS_CACHE.get(host)
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+
+    try:
+        addresses = socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+    except OSError:
+        return []
+    with _dns_lock:
+        _DNS_CACHE[host] = (addresses, time.monotonic() + DNS_CACHE_TTL)
+    return addresses
+
+def forget_host(host):
+    """
+    Drop a hostname from the DNS cache so the next connection resolves it again.
+    
+    Args:
+        host (str): Hostname to forget
+    """
+    with _dns_lock:
+        _DNS_CACHE.pop(host, None)
+
+class CachedDNSHTTPSConnection(HTTPSConnection):
+    """HTTPS connection that opens its socket to cached addresses for the host."""
+
+    def _new_conn(self):
+        dns_host = self._dns_host
+        addresses = resolve_host(dns_host, self.port)
+        if not addresses:
+            return super()._new_conn()  # Let urllib3 resolve it and report the error
+
+        # urllib3 dials _dns_host but uses host for SNI and certificate checks,
+        # which happen after the socket is open, so swap it only while connecting.
+        # Addresses are tried in order, as urllib3's create_connection does.
+        error = None
+        try:
+            for *_, sockaddr in addresses:
+                self._dns_host = sockaddr[0]
+                try:
+                    return super()._new_conn()
+                except (ConnectTimeoutError, NewConnectionError) as e:
+                    error = e
+        finally:
+            self._dns_host = dns_host
+
+        forget_host(dns_host)  # Re-resolve on the next attempt
+        raise error
+
+class CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CachedDNSHTTPSConnection
+
+class CachedDNSAdapter(HTTPAdapter):
+    """HTTP adapter whose HTTPS pools resolve hostnames through resolve_host."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            **self.poolmanager.pool_classes_by_scheme,
+            'https': CachedDNSHTTPSConnectionPool,
+        }
+
+# Shared HTTP session so Graph calls reuse pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount('https://', CachedDNSAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
+# Microsoft Graph JSON batching, limited to 20 sub-requests per call
+GRAPH_BATCH_URL = f"{GRAPH_URL}/$batch"
+BATCH_LIMIT = 20
+MAX_PARALLEL_BATCHES = 10
+
+# Graph uploads: a single PUT handles up to 4 MB, larger files use upload sessions
+SIMPLE_UPLOAD_LIMIT = 4 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 32 * 320 * 1024  # 10 MiB, must be a multiple of 320 KiB
+
+# MSAL client, built on first use and shared so its in-memory token cache is reused
+_CLIENT_APP = None
+
+# Cached auth header, refreshed shortly before the token expires
+_TOKEN_CACHE = {'value': None, 'exp': 0}
+_TOKEN_REFRESH_MARGIN = 60  # seconds
+_token_lock = threading.Lock()
 
 # Authentication Functions
 def fetch_header():
     """
     Get authentication header for Microsoft Graph API requests.
     
+    The header is cached in-process and only rebuilt once the token is
+    within a minute of expiring. The MSAL client is created on the first call,
+    since its constructor contacts Entra ID. Callers must not mutate the
+    returned dict.
+    
     Returns:
         dict: Header containing bearer token for authentication
     """
-    authority_url = f"https://login.microsoftonline.com/{SP_TENANT_ID}"
-    client_app = ConfidentialClientApplication(
-        SP_CLIENT_ID,
-        authority=authority_url,
-        client_credential=SP_CLIENT_SECRET,
-    )
-    token_response = client_app.acquire_token_for_client(
-        scopes=['https://graph.microsoft.com/.default']
-    )
-    return {'Authorization': f'Bearer {token_response["access_token"]}'}
+    if time.monotonic() < _TOKEN_CACHE['exp'] - _TOKEN_REFRESH_MARGIN:
+        return _TOKEN_CACHE['value']
+
+    global _CLIENT_APP
+    with _token_lock:
+        # Another thread may have refreshed the token while we waited
+        if time.monotonic() < _TOKEN_CACHE['exp'] - _TOKEN_REFRESH_MARGIN:
+            return _TOKEN_CACHE['value']
+
+        if _CLIENT_APP is None:
+            _CLIENT_APP = ConfidentialClientApplication(
+                SP_CLIENT_ID,
+                authority=f"https://login.microsoftonline.com/{SP_TENANT_ID}",
+                client_credential=SP_CLIENT_SECRET,
+            )
+
+        token_response = _CLIENT_APP.acquire_token_for_client(
+            scopes=['https://graph.microsoft.com/.default']
+        )
+        header = {'Authorization': f'Bearer {token_response["access_token"]}'}
+        _TOKEN_CACHE['value'] = header
+        _TOKEN_CACHE['exp'] = time.monotonic() + int(token_response.get('expires_in', 0))
+        return header
+
+# Folders seen to exist, mapped to when that knowledge expires
+_KNOWN_FOLDERS = {}
+KNOWN_FOLDER_TTL = 3600  # seconds
+KNOWN_FOLDER_LIMIT = 10000
+_folders_lock = threading.Lock()
+
+# Folder Cache Functions
+def is_known_folder(path):
+    """
+    Check whether a folder was recently confirmed to exist.
+    
+    Args:
+        path (str): Folder path relative to the drive root
+    
+    Returns:
+        bool: True if the folder is cached and not yet expired
+    """
+    return time.monotonic() < _KNOWN_FOLDERS.get(path, 0)
+
+def remember_folders(paths):
+    """
+    Record folders as existing for KNOWN_FOLDER_TTL seconds.
+    
+    Args:
+        paths (list): Folder paths relative to the drive root
+    """
+    expires_at = time.monotonic() + KNOWN_FOLDER_TTL
+    with _folders_lock:
+        if len(_KNOWN_FOLDERS) + len(paths) > KNOWN_FOLDER_LIMIT:
+            _KNOWN_FOLDERS.clear()
+        _KNOWN_FOLDERS.update(dict.fromkeys(paths, expires_at))
+
+def forget_folders(paths):
+    """
+    Drop folders from the cache so they are checked against Graph again.
+    
+    Args:
+        paths (list): Folder paths relative to the drive root
+    """
+    with _folders_lock:
+        for path in paths:
+            _KNOWN_FOLDERS.pop(path, None)
 
 # SharePoint Operations
+def send_batch(header, chunk):
+    """
+    Send a single $batch call to Microsoft Graph.
+    
+    Args:
+        header (dict): Authentication header
+        chunk (list): At most BATCH_LIMIT sub-requests
+    
+    Returns:
+        list: Sub-responses from Graph, or -1 if the batch fails
+    """
+    batch_response = _SESSION.post(
+        GRAPH_BATCH_URL,
+        headers={**header, 'Content-Type': 'application/json'},
+        data=orjson.dumps({"requests": chunk}),
+    )
+
+    if batch_response.status_code != 200:
+        logger.error("Batch request failed %s: %s", batch_response.status_code, batch_response.text)
+        return -1
+
+    return orjson.loads(batch_response.content)["responses"]
+
+def graph_batch(header, batch_requests, parallel=False):
+    """
+    Send sub-requests to Microsoft Graph in JSON batches.
+    
+    Requests are sent in groups of at most BATCH_LIMIT. By default the groups go
+    one after another, so a dependsOn chain may span batches as long as each group
+    is self-contained. Independent sub-requests can set parallel to send all groups
+    at once.
+    
+    Args:
+        header (dict): Authentication header
+        batch_requests (list): Sub-requests in Graph $batch format
+        parallel (bool): Send the groups concurrently
+    
+    Returns:
+        dict: Sub-responses keyed by request id, or -1 if a batch fails
+    """
+    chunks = [
+        batch_requests[start:start + BATCH_LIMIT]
+        for start in range(0, len(batch_requests), BATCH_LIMIT)
+    ]
+
+    if parallel and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_BATCHES) as executor:
+            results = list(executor.map(partial(send_batch, header), chunks))
+    else:
+        results = []
+        for chunk in chunks:
+            results.append(send_batch(header, chunk))
+            if results[-1] == -1:
+                break
+
+    responses = {}
+    for result in results:
+        if result == -1:
+            return -1
+        for sub_response in result:
+            responses[sub_response["id"]] = sub_response
+
+    return responses
+
 def create_folder_by_path(path):
     """
     Create folder structure in SharePoint recursively.
     
+    Folders recently seen to exist are skipped. The remaining path prefixes are
+    checked at once through $batch, then the missing folders are created in a
+    second, chained batch so parents exist before children.
+    
     Args:
         path (str): Path where folders should be created (e.g., 'folder1/folder2/folder3')
     
     Returns:
         str: URL of the created folder structure, or -1 if creation fails
     """
+    parts = [part for part in path.split('/') if part]  # Skip empty parts
+    prefixes = ['/'.join(parts[:i + 1]) for i in range(len(parts))]
+    # $batch sub-request URLs are not encoded for us, so escape each segment
+    quoted_parts = [quote(part, safe='') for part in parts]
+    url_prefixes = ['/'.join(quoted_parts[:i + 1]) for i in range(len(parts))]
+
+    if not parts:
+        return f"{DRIVE_ROOT_URL}/children"
+
+    folder_url = f"{DRIVE_ROOT_URL}:/{prefixes[-1]}:/children"
+
+    # A known folder implies its parents exist too
+    known = next((i + 1 for i in reversed(range(len(prefixes))) if is_known_folder(prefixes[i])), 0)
+    if known == len(parts):
+        logger.info("Folder '%s' exists.", prefixes[-1])
+        return folder_url
+
+    # Check which folders exist; $batch has no HEAD, so only select the id
     header = fetch_header()
-    parts = path.split('/')
-    current_path = "drive/root:"
+    check_responses = graph_batch(header, [
+        {"id": str(i), "method": "GET", "url": f"{DRIVE_ROOT_PATH}:/{url_prefixes[i]}?$select=id"}
+        for i in range(known, len(parts))
+    ], parallel=True)
+    if check_responses == -1:
+        return -1
 
-    for part in parts:
-        if not part:  # Skip empty parts
-            continue
-            
-        # Check if folder exists
-        check_url = f"https://graph.microsoft.com/v1.0/sites/{SP_SITE_ID}/{current_path}/{part}"
-        check_response = requests.get(check_url, headers=header)
-        
-        if check_response.status_code in [200, 201]:
-            print(f"Folder '{part}' exists.")
-            current_path += f"/{part}"
-        else:
-            # Create new folder
-            create_url = f"https://graph.microsoft.com/v1.0/sites/{SP_SITE_ID}/{current_path}:/children"
-            header['Content-Type'] = 'application/json'
-            folder_data = {
-                "name": part,
+    missing = len(parts)
+    for i in range(known, len(parts)):
+        status = check_responses[str(i)]["status"]
+        if status == 404:
+            missing = i
+            break
+        if status not in [200, 201]:
+            # Throttled or failed probes are not retried by the session; creating
+            # here would make a renamed duplicate of a folder that may exist
+            logger.error("Error checking folder '%s': status %s", parts[i], status)
+            return -1
+        logger.info("Folder '%s' exists.", parts[i])
+    remember_folders(prefixes[known:missing])
+
+    # Create missing folders, each depending on its parent
+    create_requests = []
+    for i in range(missing, len(parts)):
+        parent_url = f"{DRIVE_ROOT_PATH}:/{url_prefixes[i - 1]}:/children" if i else f"{DRIVE_ROOT_PATH}/children"
+        create_request = {
+            "id": str(i),
+            "method": "POST",
+            "url": parent_url,
+            "headers": {"Content-Type": "application/json"},
+            "body": {
+                "name": parts[i],
                 "folder": {},
                 "@microsoft.graph.conflictBehavior": "rename"
             }
-            create_response = requests.post(create_url, headers=header, json=folder_data)
-            
-            if create_response.status_code in [200, 201]:
-                print(f"Folder '{part}' created.")
-                current_path += f"/{part}"
-            else:
-                print(f"Error creating folder '{part}':", create_response.json())
-                return -1
-                
-    return create_url.replace(":/children", f"/{part}:/children")
+        }
+        if i > missing and (i - missing) % BATCH_LIMIT:
+            create_request["dependsOn"] = [str(i - 1)]
+        create_requests.append(create_request)
+
+    create_responses = graph_batch(header, create_requests)
+    if create_responses == -1:
+        forget_folders(prefixes)
+        return -1
+
+    for i in range(missing, len(parts)):
+        create_response = create_responses[str(i)]
+        if create_response["status"] not in [200, 201]:
+            logger.error("Error creating folder '%s': %s", parts[i], create_response.get("body"))
+            forget_folders(prefixes)
+            return -1
+        logger.info("Folder '%s' created.", parts[i])
+    remember_folders(prefixes[missing:])
+
+    return folder_url
 
 def fetch_file(path, filename):
     """
@@ -105,61 +406,143 @@ def fetch_file(path, filename):
     try:
         header = fetch_header()
         path = clean_sharepoint_path(path)
-        file_path = f"https://graph.microsoft.com/v1.0/sites/{SP_SITE_ID}/drive/root:/{path}/{filename}"
+        file_path = f"{DRIVE_ROOT_URL}:/{'/'.join(filter(None, [path, filename]))}"
         
-        response = requests.get(file_path, headers=header)
+        response = _SESSION.get(file_path, headers=header)
         
         # Handle different response status codes
         if response.status_code == 404:
-            print(f"File not found: {path}/{filename}")
+            logger.warning("File not found: %s/%s", path, filename)
             return -1
         elif response.status_code == 401:
-            print("Authentication failed. Token might be expired.")
+            logger.error("Authentication failed. Token might be expired.")
             return -1
         elif response.status_code == 403:
-            print("Permission denied to access file.")
+            logger.error("Permission denied to access file.")
             return -1
         elif response.status_code not in [200, 201]:
-            print(f"Unexpected error {response.status_code}: {response.text}")
+            logger.error("Unexpected error %s: %s", response.status_code, response.text)
             return -1
 
-        data = response.json()
+        data = orjson.loads(response.content)
         download_url = data.get('@microsoft.graph.downloadUrl')
         if not download_url:
-            print("Download URL not found in response")
+            logger.error("Download URL not found in response")
             return -1
             
         return download_url
 
     except Exception as e:
-        print(f"Error fetching file: {str(e)}")
+        logger.exception("Error fetching file: %s", e)
         return -1
 
 def upload_file(path, filename, file_contents):
     """
     Upload file to SharePoint.
     
+    Files larger than SIMPLE_UPLOAD_LIMIT go through an upload session instead
+    of a single PUT.
+    
     Args:
         path (str): Path where file should be uploaded
         filename (str): Name of the file to upload
-        file_contents (bytes): Contents of the file
+        file_contents (bytes or file-like): Contents of the file, streamed if file-like
     
     Returns:
         str: Path of uploaded file, or -1 if upload fails
     """
     header = fetch_header()
-    root_path = f"https://graph.microsoft.com/v1.0/sites/{SP_SITE_ID}/drive/root:"
-    file_path = f"{root_path}/{path}/{filename}:/content"
-    header['Content-Type'] = 'text/plain'
-    
-    response = requests.put(file_path, headers=header, data=file_contents)
+    item_path = f"{DRIVE_ROOT_URL}:/{'/'.join(filter(None, [path, filename]))}"
+    file_path = f"{item_path}:/content"
+
+    if content_length(file_contents) > SIMPLE_UPLOAD_LIMIT:
+        return upload_large_file(header, item_path, filename, file_contents)
+
+    response = _SESSION.put(
+        file_path,
+        headers={**header, 'Content-Type': 'text/plain'},
+        data=file_contents,
+    )
     if response.status_code in [200, 201]:
-        print(f"Successfully uploaded {filename}")
+        logger.info("Successfully uploaded %s", filename)
         return file_path
         
-    print(f"Failed to upload {filename}")
+    logger.error("Failed to upload %s", filename)
     return -1
 
+def upload_large_file(header, item_path, filename, file_contents):
+    """
+    Upload file to SharePoint through a resumable upload session.
+    
+    Graph requires session fragments to arrive in order, so chunks of
+    UPLOAD_CHUNK_SIZE are sent one after another.
+    
+    Args:
+        header (dict): Authentication header
+        item_path (str): Graph URL of the drive item to upload to
+        filename (str): Name of the file to upload
+        file_contents (bytes or file-like): Contents of the file
+    
+    Returns:
+        str: Path of uploaded file, or -1 if upload fails
+    """
+    session_response = _SESSION.post(
+        f"{item_path}:/createUploadSession",
+        headers={**header, 'Content-Type': 'application/json'},
+        data=orjson.dumps({"item": {"@microsoft.graph.conflictBehavior": "replace"}}),
+    )
+    if session_response.status_code != 200:
+        logger.error("Failed to create upload session for %s: %s", filename, session_response.text)
+        return -1
+    upload_url = orjson.loads(session_response.content)["uploadUrl"]
+
+    total = content_length(file_contents)
+    stream = io.BytesIO(file_contents) if isinstance(file_contents, (bytes, bytearray)) else file_contents
+    start = 0
+    while start < total:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            logger.error("File %s ended at byte %s of %s", filename, start, total)
+            _SESSION.delete(upload_url)
+            return -1
+        end = start + len(chunk) - 1
+
+        # The upload URL is pre-authenticated and rejects an Authorization header
+        response = _SESSION.put(
+            upload_url,
+            headers={'Content-Range': f'bytes {start}-{end}/{total}'},
+            data=chunk,
+        )
+        if response.status_code not in [200, 201, 202]:
+            logger.error("Failed to upload %s at bytes %s-%s: %s", filename, start, end, response.text)
+            _SESSION.delete(upload_url)
+            return -1
+        start = end + 1
+
+    logger.info("Successfully uploaded %s", filename)
+    return f"{item_path}:/content"
+
+def content_length(file_contents):
+    """
+    Get the number of bytes left to upload.
+    
+    Args:
+        file_contents (bytes or file-like): Contents of the file; streams must be seekable
+    
+    Returns:
+        int: Size in bytes from the current stream position
+    """
+    if isinstance(file_contents, (bytes, bytearray)):
+        return len(file_contents)
+
+    position = file_contents.tell()
+    end = file_contents.seek(0, os.SEEK_END)
+    file_contents.seek(position)
+    return end - position
+
+_MULTI_SLASH = re.compile(r'/+')
+_CONTENT_SUFFIX = ':/content'
+
 def clean_sharepoint_path(path):
     """
     Clean and normalize SharePoint path.
@@ -170,9 +553,8 @@ def clean_sharepoint_path(path):
     Returns:
         str: Cleaned path without extra slashes or content suffix
     """
-    path = path.replace(':/content', '')
-    path = path.strip('/')
-    return '/'.join(filter(None, path.split('/')))
+    path = path.replace(_CONTENT_SUFFIX, '')
+    return _MULTI_SLASH.sub('/', path).strip('/')
 
 # Flask Routes
 @app.route('/upload', methods=['POST'])
@@ -203,7 +585,7 @@ def upload_file_endpoint():
             return jsonify({'error': 'Failed to create folder structure'}), 500
             
         # Upload file
-        result = upload_file(path, file.filename, file.read())
+        result = upload_file(path, file.filename, file.stream)
         if result == -1:
             return jsonify({'error': 'Failed to upload file'}), 500
             
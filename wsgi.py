@@ -0,0 +1,8 @@
+"""
+WSGI entrypoint for running the SharePoint app under a production server.
+
+Usage:
+    gunicorn -w $((2 * $(nproc) + 1)) -k gthread --threads 8 wsgi:app
+"""
+
+from app import app